@@ -0,0 +1,173 @@
+"""
+Per-client admission control for the SQLi detector.
+
+Every client gets a token bucket so that one scanner cannot monopolize the
+model. Clients are identified by `client_id`: a configured API key, an id
+forwarded by a trusted peer (the web app), or otherwise the peer IP, so a
+caller cannot reset its bucket by sending new header values.
+
+A short-lived reputation table remembers clients that keep sending confirmed
+SQLi; once they reach the strike limit they are blocked straight from the
+table, without another model pass.
+
+Only the standard library is used so the Flask apps can import this too.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+ADMIT = "admit"
+SHED = "shed"
+BLOCKED = "blocked"
+
+
+@dataclass
+class _Bucket:
+    tokens: float
+    updated: float
+
+
+@dataclass
+class _Reputation:
+    strikes: int
+    expires: float
+
+
+class AdmissionController:
+    """
+    Token-bucket admission plus a reputation table, keyed by client.
+
+    rate:           tokens refilled per second for each client
+    burst:          bucket capacity (largest burst a client can send at once)
+    strikes:        confirmed SQLi hits before a client is blocked
+    reputation_ttl: seconds a strike record (and a block) lives after the last hit
+    max_clients:    clients tracked at once; least recently seen are evicted
+    api_keys:       API keys that identify a client; any other key is ignored
+    trusted_peers:  peer addresses allowed to forward a client id (X-Client-Id)
+    """
+
+    def __init__(self, rate: float = 20.0, burst: float = 40.0, strikes: int = 5,
+                 reputation_ttl: float = 300.0, max_clients: int = 10000,
+                 api_keys: Iterable[str] = (), trusted_peers: Iterable[str] = ("127.0.0.1", "::1"),
+                 clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.strikes = strikes
+        self.reputation_ttl = reputation_ttl
+        self.max_clients = max_clients
+        self.api_keys = frozenset(api_keys)
+        self.trusted_peers = frozenset(trusted_peers)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+        self._reputation: "OrderedDict[str, _Reputation]" = OrderedDict()
+        self._counts = {ADMIT: 0, SHED: 0, BLOCKED: 0}
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """
+        Build a controller from SQLI_CLIENT_RATE, SQLI_CLIENT_BURST, SQLI_BLOCK_STRIKES, SQLI_BLOCK_TTL,
+        SQLI_API_KEYS and SQLI_TRUSTED_PEERS (comma-separated lists)
+        """
+        def split(value: str) -> list:
+            return [item.strip() for item in value.split(",") if item.strip()]
+
+        return cls(
+            rate=float(os.getenv("SQLI_CLIENT_RATE", "20")),
+            burst=float(os.getenv("SQLI_CLIENT_BURST", "40")),
+            strikes=int(os.getenv("SQLI_BLOCK_STRIKES", "5")),
+            reputation_ttl=float(os.getenv("SQLI_BLOCK_TTL", "300")),
+            api_keys=split(os.getenv("SQLI_API_KEYS", "")),
+            trusted_peers=split(os.getenv("SQLI_TRUSTED_PEERS", "127.0.0.1,::1")),
+        )
+
+    def client_id(self, peer: Optional[str], api_key: Optional[str] = None,
+                  forwarded_id: Optional[str] = None) -> str:
+        """
+        Key for the token bucket and reputation table.
+        Header values are only used when they can be trusted: a configured API key,
+        or a client id forwarded by a trusted peer. Everything else keys on the peer IP.
+        """
+        if api_key and api_key in self.api_keys:
+            return f"key:{api_key}"
+        if forwarded_id and peer in self.trusted_peers:
+            return forwarded_id
+        return peer or "unknown"
+
+    def _is_blocked(self, client: str, now: float) -> bool:
+        entry = self._reputation.get(client)
+        if entry is None:
+            return False
+        if now >= entry.expires:
+            del self._reputation[client]
+            return False
+        return entry.strikes >= self.strikes
+
+    def admit(self, client: str, cost: float = 1.0) -> str:
+        """
+        Decide whether a client may spend `cost` model passes now.
+        Returns ADMIT, SHED (over its rate, or cost larger than the burst) or BLOCKED (bad reputation).
+        """
+        now = self._clock()
+        with self._lock:
+            if self._is_blocked(client, now):
+                self._counts[BLOCKED] += 1
+                return BLOCKED
+
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = _Bucket(self.burst, now)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+                bucket.updated = now
+
+            if bucket.tokens < cost:
+                self._counts[SHED] += 1
+                return SHED
+            bucket.tokens -= cost
+            self._counts[ADMIT] += 1
+            return ADMIT
+
+    def record(self, client: str, attacks: int = 1) -> None:
+        """Add strikes for confirmed SQLi sent by a client"""
+        if attacks <= 0:
+            return
+        now = self._clock()
+        with self._lock:
+            entry = self._reputation.get(client)
+            if entry is None or now >= entry.expires:
+                entry = self._reputation[client] = _Reputation(0, now)
+                if len(self._reputation) > self.max_clients:
+                    self._reputation.popitem(last=False)
+            else:
+                self._reputation.move_to_end(client)
+            entry.strikes += attacks
+            entry.expires = now + self.reputation_ttl
+
+    def stats(self) -> dict:
+        """Admitted, shed and blocked counters plus current table sizes"""
+        now = self._clock()
+        with self._lock:
+            blocked_clients = sum(
+                1 for entry in self._reputation.values()
+                if entry.strikes >= self.strikes and now < entry.expires
+            )
+            return {
+                "admitted": self._counts[ADMIT],
+                "shed": self._counts[SHED],
+                "blocked": self._counts[BLOCKED],
+                "tracked_clients": len(self._buckets),
+                "blocked_clients": blocked_clients,
+                "config": {
+                    "rate": self.rate,
+                    "burst": self.burst,
+                    "strikes": self.strikes,
+                    "reputation_ttl": self.reputation_ttl,
+                },
+            }
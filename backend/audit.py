@@ -0,0 +1,213 @@
+"""
+Asynchronous batched audit log for detections and blocked requests.
+
+Request threads only put a small dict on a bounded in-memory queue. A
+background thread drains it in batches, appends JSON lines to audit-<pid>.jsonl
+and, once the file grows past max_bytes, rotates it to a timestamped .jsonl.gz.
+
+Every process writes and rotates only its own file, so several workers (or the
+Flask reloader and its child) can share one directory without racing on rename.
+A process forked after start() (gunicorn --preload) does not inherit the
+writer thread, so it gets a fresh queue and writer of its own.
+
+When the queue is full the policy decides: "drop" discards the record and
+counts it, "block" waits up to block_timeout for the writer to make room and
+then drops it. Records emitted after close() are dropped and counted too.
+"""
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+DROP = "drop"
+BLOCK = "block"
+
+_STOP = object()
+
+
+def payload_hash(text: str) -> str:
+    """SHA-256 of a payload, so records can be correlated without storing raw input"""
+    return hashlib.sha256(text.encode("utf-8", errors="replace")).hexdigest()
+
+
+class AuditLog:
+    """
+    Bounded queue plus a background writer producing rotating, compressed JSONL files.
+
+    directory:      where audit-<pid>.jsonl and the rotated audit-*.jsonl.gz files live
+    max_queue:      records held in memory before the full-queue policy applies
+    batch_size:     records written per batch
+    flush_interval: seconds the writer waits before writing a partial batch
+    max_bytes:      size at which a process's file is rotated and compressed
+    backup_count:   compressed files kept across all processes; older ones are deleted
+    policy:         DROP (count and discard) or BLOCK (wait) when the queue is full
+    block_timeout:  seconds a BLOCK emit waits before the record is dropped
+    """
+
+    def __init__(self, directory: Path, max_queue: int = 10000, batch_size: int = 256,
+                 flush_interval: float = 1.0, max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 10, policy: str = DROP, block_timeout: float = 5.0):
+        if policy not in (DROP, BLOCK):
+            raise ValueError(f"Unknown audit queue policy: {policy}")
+        self.directory = Path(directory)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.policy = policy
+        self.max_queue = max_queue
+        self.block_timeout = block_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._hooks_registered = False
+        self._counts_lock = threading.Lock()
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+        self.rotations = 0
+
+    @property
+    def path(self) -> Path:
+        """Active file of the calling process (the writer thread runs in the process that started it)"""
+        return self.directory / f"audit-{os.getpid()}.jsonl"
+
+    @classmethod
+    def from_env(cls, default_directory: Path) -> "AuditLog":
+        """Build a log from SQLI_AUDIT_DIR, SQLI_AUDIT_QUEUE, SQLI_AUDIT_POLICY, SQLI_AUDIT_MAX_BYTES, SQLI_AUDIT_BACKUPS"""
+        return cls(
+            directory=Path(os.getenv("SQLI_AUDIT_DIR", str(default_directory))),
+            max_queue=int(os.getenv("SQLI_AUDIT_QUEUE", "10000")),
+            policy=os.getenv("SQLI_AUDIT_POLICY", DROP),
+            max_bytes=int(os.getenv("SQLI_AUDIT_MAX_BYTES", str(10 * 1024 * 1024))),
+            backup_count=int(os.getenv("SQLI_AUDIT_BACKUPS", "10")),
+        )
+
+    def start(self) -> "AuditLog":
+        """Start the background writer (flushed on interpreter exit, restarted in forked children)"""
+        if self._thread is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+            if not self._hooks_registered:
+                atexit.register(self.close)
+                if hasattr(os, "register_at_fork"):  # not on Windows, which cannot fork
+                    os.register_at_fork(after_in_child=self._after_fork)
+                self._hooks_registered = True
+        return self
+
+    def _after_fork(self) -> None:
+        """Only the forking thread survives a fork: give the child its own queue and writer"""
+        running = self._thread is not None
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._counts_lock = threading.Lock()
+        self._thread = None
+        self.dropped = self.written = self.write_errors = self.rotations = 0
+        if running:
+            self.start()
+
+    def emit(self, event: str, **fields) -> bool:
+        """
+        Queue a structured record; never touches the disk.
+        Returns False if the record was dropped: the queue stayed full, or the
+        writer was closed or has died.
+        """
+        record = {"ts": time.time(), "event": event, **fields}
+        writer_gone = self._closed or (self._thread is not None and not self._thread.is_alive())
+        if not writer_gone:
+            try:
+                if self.policy == BLOCK:
+                    self._queue.put(record, timeout=self.block_timeout)
+                else:
+                    self._queue.put_nowait(record)
+                return True
+            except queue.Full:
+                pass
+        with self._counts_lock:
+            self.dropped += 1
+        return False
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write out everything queued so far and stop the writer"""
+        if self._thread is None:
+            return
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:  # the writer is gone or stuck; do not hang interpreter exit
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> dict:
+        with self._counts_lock:
+            return {
+                "queued": self._queue.qsize(),
+                "written": self.written,
+                "dropped": self.dropped,
+                "write_errors": self.write_errors,
+                "rotations": self.rotations,
+                "policy": self.policy,
+                "path": str(self.path),
+            }
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+                batch = [record for record in batch if record is not _STOP]
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: list) -> None:
+        lines = []
+        for record in batch:
+            record["ts"] = datetime.fromtimestamp(record["ts"], timezone.utc).isoformat()
+            lines.append(json.dumps(record, ensure_ascii=False, default=str))
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            with self._counts_lock:
+                self.written += len(batch)
+            if self.path.stat().st_size >= self.max_bytes:
+                self._rotate()
+        except OSError as e:
+            with self._counts_lock:
+                self.write_errors += 1
+            print(f"[AUDIT] Write error: {e}")
+
+    def _rotate(self) -> None:
+        """Compress this process's file to audit-<utc timestamp>-<pid>.jsonl.gz and prune old files"""
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+        rotated = self.directory / f"audit-{stamp}-{os.getpid()}.jsonl"
+        os.replace(self.path, rotated)
+        with open(rotated, "rb") as src, gzip.open(f"{rotated}.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        rotated.unlink()
+        with self._counts_lock:
+            self.rotations += 1
+
+        backups = sorted(self.directory.glob("audit-*.jsonl.gz"))
+        for old in backups[:max(len(backups) - self.backup_count, 0)]:
+            old.unlink(missing_ok=True)  # another process may be pruning too
@@ -0,0 +1,254 @@
+"""
+Offline evaluation and threshold tuning for the SQLi detector.
+
+Scores a labelled CSV/JSONL dataset through the serving preprocessing in large
+batches and caches the raw probabilities on disk, keyed by the model hash.
+Curves, confusion matrices and per-length error rates are then computed from
+the cache, so trying another threshold does not rerun the model.
+
+Usage:
+    uv run python -m backend.evaluate Modified_SQL_Dataset.csv
+    uv run python -m backend.evaluate Modified_SQL_Dataset.csv --split test --threshold 0.7
+    uv run python -m backend.evaluate data.jsonl --text-column text --label-column label --curves-out curves.json
+
+The suggested threshold is served by setting SQLI_THRESHOLD for backend/model.py.
+"""
+import argparse
+import csv
+import hashlib
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from backend import model
+
+CACHE_DIR = model.BASE_DIR / ".eval_cache"
+LENGTH_BUCKETS = [0, 16, 32, 64, 128]
+
+
+@dataclass
+class ScoredDataset:
+    """Cached model output for a labelled dataset"""
+    probabilities: np.ndarray  # float32, SQLi probability per row
+    labels: np.ndarray         # int8, 1 = SQLi
+    lengths: np.ndarray        # int32, normalized input length before truncation
+
+    def subset(self, indices: np.ndarray) -> "ScoredDataset":
+        return ScoredDataset(self.probabilities[indices], self.labels[indices], self.lengths[indices])
+
+
+def load_labelled(path: Path, text_column: str = "Query", label_column: str = "Label") -> tuple[List[str], np.ndarray]:
+    """Load (texts, labels) from a CSV file or a JSONL file with one object per line"""
+    texts, labels = [], []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.suffix.lower() in (".jsonl", ".ndjson"):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for row in rows:
+            texts.append(str(row[text_column]))
+            labels.append(int(row[label_column]))
+    return texts, np.array(labels, dtype=np.int8)
+
+
+def test_split_indices(labels: np.ndarray) -> np.ndarray:
+    """Row indices of the held-out test split used in sqli_rnn_training.ipynb"""
+    from sklearn.model_selection import train_test_split
+
+    _, test_idx = train_test_split(
+        np.arange(len(labels)), test_size=0.2, random_state=42, stratify=labels
+    )
+    return np.sort(test_idx)
+
+
+def cache_path(dataset_path: Path, text_column: str = "Query", label_column: str = "Label",
+               cache_dir: Path = CACHE_DIR) -> Path:
+    """Cache file for a dataset and column choice under the currently loaded model, backend and tokenizer"""
+    digest = hashlib.sha256()
+    digest.update(model.file_sha256(dataset_path).encode())
+    digest.update(model.file_sha256(model.TOKENIZER_PATH).encode())
+    digest.update(json.dumps([text_column, label_column, model.SQLI_BACKEND]).encode())
+    return cache_dir / model.model_sha256[:16] / f"{dataset_path.stem}-{digest.hexdigest()[:16]}.npz"
+
+
+def score_dataset(dataset_path: Path, text_column: str = "Query", label_column: str = "Label",
+                  cache_dir: Path = CACHE_DIR, refresh: bool = False) -> ScoredDataset:
+    """Score every row of a dataset, reusing cached probabilities when available"""
+    if model.session is None:
+        model.load_model()
+
+    path = cache_path(dataset_path, text_column, label_column, cache_dir)
+    if path.exists() and not refresh:
+        cached = np.load(path)
+        print(f"Loaded cached scores from {path}")
+        return ScoredDataset(cached["probabilities"], cached["labels"], cached["lengths"])
+
+    texts, labels = load_labelled(dataset_path, text_column, label_column)
+    print(f"Scoring {len(texts):,} rows from {dataset_path} (batch size {model.BATCH_SIZE})...")
+    probabilities = model.predict_proba_batch(texts)
+    lengths = np.array([len(model.normalize_sql_input(t)) for t in texts], dtype=np.int32)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(path, probabilities=probabilities, labels=labels, lengths=lengths)
+    print(f"Cached scores to {path}")
+    return ScoredDataset(probabilities, labels, lengths)
+
+
+def _threshold_counts(labels: np.ndarray, probabilities: np.ndarray):
+    """Cumulative (thresholds, tps, fps) for every distinct probability, descending"""
+    order = np.argsort(-probabilities, kind="mergesort")
+    probs = probabilities[order]
+    y = labels[order].astype(np.int64)
+    last = np.r_[np.where(np.diff(probs))[0], y.size - 1]
+    tps = np.cumsum(y)[last]
+    fps = (last + 1) - tps
+    return probs[last], tps, fps
+
+
+def roc_curve(labels: np.ndarray, probabilities: np.ndarray):
+    """Returns (fpr, tpr, thresholds); a row is positive when probability >= threshold"""
+    thresholds, tps, fps = _threshold_counts(labels, probabilities)
+    positives = max(int(labels.sum()), 1)
+    negatives = max(int(labels.size - labels.sum()), 1)
+    fpr = np.r_[0.0, fps / negatives]
+    tpr = np.r_[0.0, tps / positives]
+    return fpr, tpr, np.r_[np.inf, thresholds]
+
+
+def pr_curve(labels: np.ndarray, probabilities: np.ndarray):
+    """Returns (precision, recall, thresholds), ordered by decreasing threshold"""
+    thresholds, tps, fps = _threshold_counts(labels, probabilities)
+    precision = tps / np.maximum(tps + fps, 1)
+    recall = tps / max(int(labels.sum()), 1)
+    return precision, recall, thresholds
+
+
+def roc_auc(labels: np.ndarray, probabilities: np.ndarray) -> float:
+    fpr, tpr, _ = roc_curve(labels, probabilities)
+    return float(np.trapezoid(tpr, fpr))
+
+
+def average_precision(labels: np.ndarray, probabilities: np.ndarray) -> float:
+    precision, recall, _ = pr_curve(labels, probabilities)
+    return float(np.sum(np.diff(np.r_[0.0, recall]) * precision))
+
+
+def confusion_at(labels: np.ndarray, probabilities: np.ndarray, threshold: float) -> dict:
+    """Confusion matrix counts when predicting SQLi for probability >= threshold"""
+    predicted = probabilities >= threshold
+    actual = labels == 1
+    return {
+        "tn": int(np.sum(~predicted & ~actual)),
+        "fp": int(np.sum(predicted & ~actual)),
+        "fn": int(np.sum(~predicted & actual)),
+        "tp": int(np.sum(predicted & actual)),
+    }
+
+
+def length_bucket_errors(data: ScoredDataset, threshold: float, max_len: int) -> List[dict]:
+    """Error rates per normalized-length bucket; the last bucket holds truncated inputs"""
+    edges = [e for e in LENGTH_BUCKETS if e < max_len] + [max_len + 1, np.iinfo(np.int32).max]
+    rows = []
+    for low, high in zip(edges[:-1], edges[1:]):
+        mask = (data.lengths >= low) & (data.lengths < high)
+        counts = confusion_at(data.labels[mask], data.probabilities[mask], threshold)
+        total = int(mask.sum())
+        name = f"{low}-{high - 1}" if high != edges[-1] else f">{max_len}"
+        rows.append({
+            "bucket": name,
+            "count": total,
+            "error_rate": (counts["fp"] + counts["fn"]) / total if total else 0.0,
+            **counts,
+        })
+    return rows
+
+
+def suggest_threshold(labels: np.ndarray, probabilities: np.ndarray, max_fpr: Optional[float] = None) -> float:
+    """
+    Pick a threshold from the cached scores.
+    Maximizes F1, or recall subject to FPR <= max_fpr when given.
+    """
+    thresholds, tps, fps = _threshold_counts(labels, probabilities)
+    if max_fpr is not None:
+        negatives = max(int(labels.size - labels.sum()), 1)
+        allowed = np.where(fps / negatives <= max_fpr)[0]
+        if allowed.size == 0:
+            return float(np.nextafter(thresholds[0], np.inf))
+        return float(thresholds[allowed[-1]])
+    fns = int(labels.sum()) - tps
+    f1 = 2 * tps / np.maximum(2 * tps + fps + fns, 1)
+    return float(thresholds[int(np.argmax(f1))])
+
+
+def print_report(data: ScoredDataset, threshold: float, max_len: int) -> None:
+    counts = confusion_at(data.labels, data.probabilities, threshold)
+    tp, fp, fn, tn = counts["tp"], counts["fp"], counts["fn"], counts["tn"]
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+    print("=" * 60)
+    print(f"Rows: {data.labels.size:,} (SQLi: {int(data.labels.sum()):,})")
+    print(f"ROC AUC:           {roc_auc(data.labels, data.probabilities):.6f}")
+    print(f"Average precision: {average_precision(data.labels, data.probabilities):.6f}")
+    print("=" * 60)
+    print(f"Threshold: {threshold:.6f}")
+    print(f"  Accuracy:  {(tp + tn) / max(data.labels.size, 1):.4%}")
+    print(f"  Precision: {precision:.4%}  Recall: {recall:.4%}  F1: {f1:.4f}")
+    print("  Confusion matrix (rows = actual, cols = predicted):")
+    print("               Normal    SQLi")
+    print(f"    Normal   {tn:8d} {fp:7d}")
+    print(f"    SQLi     {fn:8d} {tp:7d}")
+    print("=" * 60)
+    print(f"{'Length':>10} {'Count':>8} {'FP':>6} {'FN':>6} {'Error':>8}")
+    for row in length_bucket_errors(data, threshold, max_len):
+        print(f"{row['bucket']:>10} {row['count']:8d} {row['fp']:6d} {row['fn']:6d} {row['error_rate']:8.3%}")
+    print("=" * 60)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Evaluate the SQLi detector and tune its threshold")
+    parser.add_argument("dataset", type=Path, help="Labelled CSV or JSONL file")
+    parser.add_argument("--text-column", default="Query")
+    parser.add_argument("--label-column", default="Label")
+    parser.add_argument("--split", choices=["all", "test"], default="all",
+                        help="'test' reproduces the notebook's held-out split")
+    parser.add_argument("--threshold", type=float, default=model.SQLI_THRESHOLD)
+    parser.add_argument("--max-fpr", type=float, default=None,
+                        help="Suggest the threshold with the best recall at or below this FPR")
+    parser.add_argument("--curves-out", type=Path, default=None, help="Write ROC/PR curves as JSON")
+    parser.add_argument("--cache-dir", type=Path, default=CACHE_DIR)
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached scores")
+    args = parser.parse_args(argv)
+
+    data = score_dataset(args.dataset, args.text_column, args.label_column, args.cache_dir, args.refresh)
+    if args.split == "test":
+        data = data.subset(test_split_indices(data.labels))
+
+    max_len = model.tokenizer_config["max_len"]
+    print_report(data, args.threshold, max_len)
+
+    suggested = suggest_threshold(data.labels, data.probabilities, args.max_fpr)
+    counts = confusion_at(data.labels, data.probabilities, suggested)
+    criterion = f"best recall at FPR <= {args.max_fpr}" if args.max_fpr is not None else "best F1"
+    print(f"Suggested threshold ({criterion}): {suggested:.6f} -> {counts}")
+    print(f"  Serve it with: SQLI_THRESHOLD={suggested:.6f}")
+
+    if args.curves_out:
+        fpr, tpr, roc_thresholds = roc_curve(data.labels, data.probabilities)
+        precision, recall, pr_thresholds = pr_curve(data.labels, data.probabilities)
+        curves = {
+            "model_sha256": model.model_sha256,
+            "roc": {"fpr": fpr.tolist(), "tpr": tpr.tolist(), "thresholds": [None] + roc_thresholds[1:].tolist()},
+            "pr": {"precision": precision.tolist(), "recall": recall.tolist(), "thresholds": pr_thresholds.tolist()},
+        }
+        with open(args.curves_out, "w", encoding="utf-8") as f:
+            json.dump(curves, f)
+        print(f"✓ Curves written to {args.curves_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,76 @@
 import numpy as np
-import onnxruntime as ort
+import codecs
+import hashlib
 import json
-import re
-from fastapi import FastAPI, HTTPException
+import math
+import os
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 from contextlib import asynccontextmanager
 from pathlib import Path
 import uvicorn
 
+try:
+    from backend.admission import AdmissionController, BLOCKED, SHED
+    from backend.numpy_lstm import NumpyLSTM, WEIGHTS_PATH
+    from backend.preprocessing import encode_text, encode_texts, normalize_sql_input
+    from backend.streaming import NumpyStreamingDetector, StreamingDetector
+except ModuleNotFoundError:  # run directly as `python backend/model.py`
+    from admission import AdmissionController, BLOCKED, SHED
+    from numpy_lstm import NumpyLSTM, WEIGHTS_PATH
+    from preprocessing import encode_text, encode_texts, normalize_sql_input
+    from streaming import NumpyStreamingDetector, StreamingDetector
+
 # Get absolute path to model and config files
 BASE_DIR = Path(__file__).resolve().parent.parent
 MODEL_PATH = BASE_DIR / "models" / "sqli_lstm.onnx"
 TOKENIZER_PATH = BASE_DIR / "models" / "sqli_tokenizer.json"
 
+# Decision threshold on the SQLi probability (tune with `python -m backend.evaluate`)
+SQLI_THRESHOLD = float(os.getenv("SQLI_THRESHOLD", "0.5"))
+# Inference backend: "onnxruntime" or "numpy" (weights from `python -m backend.numpy_lstm extract`)
+SQLI_BACKEND = os.getenv("SQLI_BACKEND", "onnxruntime")
+BATCH_SIZE = int(os.getenv("SQLI_BATCH_SIZE", "256"))
+# Largest raw body /predict/stream will read, in bytes
+STREAM_MAX_BYTES = int(os.getenv("SQLI_STREAM_MAX_BYTES", str(64 * 1024)))
+
 session = None
 tokenizer_config = None
+model_sha256 = None
+streaming_detector = None
+admission = AdmissionController.from_env()
 
 
-def normalize_sql_input(text: str) -> str:
-    """
-    Normalize input to match training data format (add spaces around operators).
-    The training data has specific formatting with spaces around operators.
-    """
-    text = re.sub(r'([=<>!]+)', r'  \1  ', text)  # Operators
-    text = re.sub(r'([()])', r'  \1  ', text)      # Parentheses
-    text = re.sub(r',', ' , ', text)               # Commas
-    text = re.sub(r"'", " ' ", text)               # Single quotes
-    text = re.sub(r'"', ' " ', text)               # Double quotes
-    text = re.sub(r'\s+', ' ', text)               # Normalize multiple spaces
-    return text.strip().lower()
-
-
-def encode_text(text: str, char_to_idx: dict, max_len: int) -> List[int]:
-    """Encode text to sequence of character indices"""
-    encoded = []
-    for char in text[:max_len]:
-        encoded.append(char_to_idx.get(char, char_to_idx.get('<UNK>', 1)))
-    
-    # Pad if necessary
-    pad_idx = char_to_idx.get('<PAD>', 0)
-    while len(encoded) < max_len:
-        encoded.append(pad_idx)
-    
-    return encoded
+def file_sha256(path: Path) -> str:
+    """SHA-256 of a file, used to identify the exact model weights being served"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
 
 def load_model():
-    global session, tokenizer_config
+    global session, tokenizer_config, model_sha256, streaming_detector
     try:
-        # Load ONNX model
-        if not MODEL_PATH.exists():
-            raise FileNotFoundError(f"Model file not found: {MODEL_PATH}")
-        session = ort.InferenceSession(str(MODEL_PATH))
-        print(f"Model loaded successfully from {MODEL_PATH}")
+        if SQLI_BACKEND == "numpy":
+            # Load NumPy weights extracted from the ONNX model
+            if not WEIGHTS_PATH.exists():
+                raise FileNotFoundError(f"Weights file not found: {WEIGHTS_PATH}")
+            session = NumpyLSTM.load(WEIGHTS_PATH)
+            model_sha256 = session.source_sha256
+            print(f"NumPy model loaded successfully from {WEIGHTS_PATH} (sha256={model_sha256[:12]})")
+        elif SQLI_BACKEND == "onnxruntime":
+            # Load ONNX model
+            import onnxruntime as ort
+            if not MODEL_PATH.exists():
+                raise FileNotFoundError(f"Model file not found: {MODEL_PATH}")
+            session = ort.InferenceSession(str(MODEL_PATH))
+            model_sha256 = file_sha256(MODEL_PATH)
+            print(f"Model loaded successfully from {MODEL_PATH} (sha256={model_sha256[:12]})")
+        else:
+            raise ValueError(f"Unknown SQLI_BACKEND: {SQLI_BACKEND}")
         
         # Load tokenizer config
         if not TOKENIZER_PATH.exists():
@@ -62,39 +79,81 @@ def load_model():
             tokenizer_config = json.load(f)
         print(f"Tokenizer loaded: vocab_size={tokenizer_config['vocab_size']}, max_len={tokenizer_config['max_len']}")
         
+        # Stateful variant of the same weights for /predict/stream
+        if SQLI_BACKEND == "numpy":
+            streaming_detector = NumpyStreamingDetector(session, tokenizer_config, SQLI_THRESHOLD)
+        else:
+            streaming_detector = StreamingDetector.from_model(MODEL_PATH, tokenizer_config, SQLI_THRESHOLD)
+        print("Streaming model ready (explicit LSTM state inputs/outputs)")
+        
     except Exception as e:
         print(f"Error loading model: {e}")
         raise e
 
 
-def predict_sqli(text: str) -> tuple[float, str]:
+def encode_batch(texts: List[str]) -> np.ndarray:
+    """Normalize and encode texts into a (batch, max_len) int64 array"""
+    return encode_texts(texts, tokenizer_config)
+
+
+def predict_proba_batch(texts: List[str], batch_size: int = BATCH_SIZE) -> np.ndarray:
     """
-    Predict if a text contains SQL injection.
-    Returns (probability, label).
+    Score many texts with the serving preprocessing.
+    Returns a float32 array of SQLi probabilities, one per text.
     """
     if session is None or tokenizer_config is None:
         raise RuntimeError("Model not loaded")
     
-    # Normalize input to match training data format
-    normalized = normalize_sql_input(text)
-    
-    # Encode to character indices
-    char_to_idx = tokenizer_config['char_to_idx']
-    max_len = tokenizer_config['max_len']
-    encoded = encode_text(normalized, char_to_idx, max_len)
-    
-    # Prepare input for ONNX (batch_size=1, seq_len=max_len)
-    input_data = np.array([encoded], dtype=np.int64)
-    
-    # Run inference
     input_name = session.get_inputs()[0].name
-    outputs = session.run(None, {input_name: input_data})
-    probability = float(outputs[0][0][0])
+    probabilities = np.empty(len(texts), dtype=np.float32)
+    for start in range(0, len(texts), batch_size):
+        input_data = encode_batch(texts[start:start + batch_size])
+        outputs = session.run(None, {input_name: input_data})
+        probabilities[start:start + batch_size] = outputs[0][:, 0]
     
-    # Threshold at 0.5
-    label = "SQLi" if probability >= 0.5 else "Normal"
+    return probabilities
+
+
+def label_for(probability: float) -> str:
+    """Map a probability to a label using the configured threshold"""
+    return "SQLi" if probability >= SQLI_THRESHOLD else "Normal"
+
+
+def predict_sqli(text: str) -> tuple[float, str]:
+    """
+    Predict if a text contains SQL injection.
+    Returns (probability, label).
+    """
+    if session is None or tokenizer_config is None:
+        raise RuntimeError("Model not loaded")
     
-    return probability, label
+    probability = float(predict_proba_batch([text])[0])
+    return probability, label_for(probability)
+
+
+def model_version() -> Optional[str]:
+    """Short model hash reported with every prediction (used in audit records)"""
+    return model_sha256[:12] if model_sha256 else None
+
+
+def client_key(request: Request) -> str:
+    """Identify the caller: a configured API key, an id forwarded by a trusted peer, else the peer IP"""
+    return admission.client_id(
+        request.client.host if request.client else None,
+        api_key=request.headers.get("X-API-Key"),
+        forwarded_id=request.headers.get("X-Client-Id"),
+    )
+
+
+def admit_client(client: str, cost: int = 1) -> bool:
+    """
+    Apply admission control before spending model passes on a client.
+    Raises 429 when the client is over its rate; returns False when it is blocked by reputation.
+    """
+    decision = admission.admit(client, cost)
+    if decision == SHED:
+        raise HTTPException(status_code=429, detail="Rate limit exceeded", headers={"Retry-After": "1"})
+    return decision != BLOCKED
 
 
 # Lifespan context manager
@@ -131,6 +190,16 @@ class PredictionResponse(BaseModel):
     probability: float
     label: str
     normalized_input: Optional[str] = None
+    source: str = "model"  # "model" or "reputation" (client blocked without a model pass)
+    model_version: Optional[str] = None  # first 12 hex digits of the model's SHA-256
+
+
+BLOCKED_RESPONSE = PredictionResponse(prediction=1, probability=1.0, label="SQLi", source="reputation")
+
+
+class StreamPredictionResponse(PredictionResponse):
+    chars_scored: int = 0       # normalized characters fed through the model
+    early_block: bool = False   # body reading stopped once the score crossed the threshold
 
 
 class BatchTextRequest(BaseModel):
@@ -158,7 +227,9 @@ async def root():
         "endpoints": {
             "/predict": "POST - Detect SQLi in text",
             "/predict/batch": "POST - Batch SQLi detection",
+            "/predict/stream": "POST - Incremental SQLi detection on a raw (chunked) body",
             "/health": "GET - Health check",
+            "/admission/stats": "GET - Admission control counters",
             "/model/info": "GET - Model information"
         }
     }
@@ -174,7 +245,7 @@ async def health_check():
 
 
 @app.post("/predict", response_model=PredictionResponse)
-async def predict(request: TextRequest):
+async def predict(request: TextRequest, raw_request: Request):
     """
     Detect SQL injection in the provided text.
     The text will be normalized and analyzed using a character-level LSTM model.
@@ -182,45 +253,143 @@ async def predict(request: TextRequest):
     if session is None or tokenizer_config is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
+    client = client_key(raw_request)
+    if not admit_client(client):
+        return BLOCKED_RESPONSE
+    
     try:
         probability, label = predict_sqli(request.text)
         prediction = 1 if label == "SQLi" else 0
+        admission.record(client, prediction)
         
         return PredictionResponse(
             prediction=prediction,
             probability=probability,
             label=label,
-            normalized_input=normalize_sql_input(request.text)
+            normalized_input=normalize_sql_input(request.text),
+            model_version=model_version()
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Prediction error: {str(e)}")
 
 
 @app.post("/predict/batch", response_model=BatchPredictionResponse)
-async def predict_batch(request: BatchTextRequest):
+async def predict_batch(request: BatchTextRequest, raw_request: Request):
     """
     Detect SQL injection in multiple texts at once.
+    Each text costs one admission token.
     """
     if session is None or tokenizer_config is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
+    if len(request.texts) > admission.burst:
+        raise HTTPException(status_code=413, detail=f"Batch larger than {int(admission.burst)} texts")
+    
+    client = client_key(raw_request)
+    if not admit_client(client, cost=max(len(request.texts), 1)):
+        return BatchPredictionResponse(predictions=[BLOCKED_RESPONSE] * len(request.texts))
+    
     try:
         predictions = []
-        for text in request.texts:
-            probability, label = predict_sqli(text)
+        for probability in predict_proba_batch(request.texts):
+            probability = float(probability)
+            label = label_for(probability)
             prediction = 1 if label == "SQLi" else 0
             
             predictions.append(PredictionResponse(
                 prediction=prediction,
                 probability=probability,
-                label=label
+                label=label,
+                model_version=model_version()
             ))
         
+        admission.record(client, sum(p.prediction for p in predictions))
         return BatchPredictionResponse(predictions=predictions)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Batch prediction error: {str(e)}")
 
 
+@app.post("/predict/stream", response_model=StreamPredictionResponse)
+async def predict_stream(raw_request: Request):
+    """
+    Detect SQL injection in a raw request body as it arrives.
+    Chunks are scored with the stateful LSTM; only the recurrent state is kept,
+    and reading stops as soon as the running score crosses the threshold.
+    A stream costs one admission token per max_len bytes, capped at the bucket
+    size so any body up to SQLI_STREAM_MAX_BYTES fits a full bucket. It is
+    charged up front from Content-Length, or as chunks arrive when the body is
+    chunked. Larger bodies are rejected with 413.
+    """
+    if streaming_detector is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    try:
+        declared = int(raw_request.headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+    too_large = HTTPException(status_code=413, detail=f"Body larger than {STREAM_MAX_BYTES} bytes")
+    if declared > STREAM_MAX_BYTES:
+        raise too_large
+    
+    max_len = streaming_detector.max_len
+    max_cost = max(int(admission.burst), 1)
+    
+    def stream_cost(size: int) -> int:
+        return min(max(math.ceil(size / max_len), 1), max_cost)
+    
+    client = client_key(raw_request)
+    charged = stream_cost(declared)
+    if not admit_client(client, charged):
+        return StreamPredictionResponse(**BLOCKED_RESPONSE.model_dump())
+    
+    try:
+        stream = streaming_detector.open()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        received = 0
+        early_block = False
+        async for chunk in raw_request.stream():
+            received += len(chunk)
+            if received > STREAM_MAX_BYTES:
+                raise too_large
+            owed = stream_cost(received) - charged
+            if owed > 0:
+                charged += owed
+                if not admit_client(client, owed):
+                    return StreamPredictionResponse(**BLOCKED_RESPONSE.model_dump(), chars_scored=stream.consumed)
+            stream.feed(decoder.decode(chunk))
+            if stream.blocked:
+                early_block = True
+                break
+        else:
+            stream.feed(decoder.decode(b"", final=True))
+            stream.finish()
+        
+        label = label_for(stream.score)
+        prediction = 1 if label == "SQLi" else 0
+        admission.record(client, prediction)
+        
+        return StreamPredictionResponse(
+            prediction=prediction,
+            probability=stream.score,
+            label=label,
+            model_version=model_version(),
+            chars_scored=stream.consumed,
+            early_block=early_block
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Stream prediction error: {str(e)}")
+
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """
+    Admission control counters: admitted, shed (rate limited) and blocked (reputation) requests.
+    """
+    return admission.stats()
+
+
 @app.get("/model/info")
 async def model_info():
     """
@@ -235,7 +404,10 @@ async def model_info():
     return {
         "model": {
             "type": "LSTM character-level classifier",
-            "file": str(MODEL_PATH.name),
+            "backend": SQLI_BACKEND,
+            "file": str(WEIGHTS_PATH.name if SQLI_BACKEND == "numpy" else MODEL_PATH.name),
+            "sha256": model_sha256,
+            "threshold": SQLI_THRESHOLD,
             "inputs": [{"name": i.name, "shape": i.shape, "type": i.type} for i in inputs],
             "outputs": [{"name": o.name, "shape": o.shape, "type": o.type} for o in outputs]
         },
@@ -251,13 +423,16 @@ async def model_info():
 
 
 @app.post("/debug/predict")
-async def debug_predict(request: TextRequest):
+async def debug_predict(request: TextRequest, raw_request: Request):
     """
     Debug endpoint to see preprocessing and raw model output.
     """
     if session is None or tokenizer_config is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
+    if not admit_client(client_key(raw_request)):
+        raise HTTPException(status_code=403, detail="Client blocked")
+    
     try:
         # Normalize
         normalized = normalize_sql_input(request.text)
@@ -282,7 +457,8 @@ async def debug_predict(request: TextRequest):
             "input_shape": list(input_data.shape),
             "raw_output": outputs[0].tolist(),
             "probability": probability,
-            "prediction": "SQLi" if probability >= 0.5 else "Normal"
+            "threshold": SQLI_THRESHOLD,
+            "prediction": label_for(probability)
         }
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,306 @@
+"""
+Pure-NumPy inference backend for the SQLi LSTM.
+
+The embedding, LSTM and dense weights are extracted once from sqli_lstm.onnx
+into an .npz file. Loading and running them needs only NumPy, so small workers
+do not have to import onnxruntime (or TensorFlow/torch). Select it in the API
+server with SQLI_BACKEND=numpy, or call `score(texts)` directly: together with
+backend/preprocessing.py it needs nothing beyond NumPy (`uv sync` without extras).
+
+Usage:
+    uv run python -m backend.numpy_lstm extract   # models/sqli_lstm.onnx -> models/sqli_lstm_weights.npz
+    uv run python -m backend.numpy_lstm verify    # compare with onnxruntime on the test split
+    uv run python -m backend.numpy_lstm bench     # import time, memory and throughput vs onnxruntime
+"""
+import argparse
+import hashlib
+import json
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+try:
+    from backend.preprocessing import encode_texts
+except ModuleNotFoundError:  # imported by `python backend/model.py`
+    from preprocessing import encode_texts
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODEL_PATH = BASE_DIR / "models" / "sqli_lstm.onnx"
+TOKENIZER_PATH = BASE_DIR / "models" / "sqli_tokenizer.json"
+WEIGHTS_PATH = BASE_DIR / "models" / "sqli_lstm_weights.npz"
+
+# Same fields as onnxruntime.NodeArg, for /model/info
+NodeArg = namedtuple("NodeArg", ["name", "shape", "type"])
+
+
+def extract_weights(src: Path = MODEL_PATH, dst: Optional[Path] = WEIGHTS_PATH) -> dict:
+    """
+    Pull the weights out of the exported ONNX graph.
+    LSTM gates keep the ONNX order (input, output, forget, cell); both bias halves are summed.
+    """
+    import onnx
+    from onnx import numpy_helper
+
+    graph = onnx.load(str(src)).graph
+    initializers = {i.name: numpy_helper.to_array(i) for i in graph.initializer}
+    input_name = graph.input[0].name
+
+    weights = {}
+    lstm_layer = dense_layer = 0
+    for node in graph.node:
+        if node.op_type == "Gather" and node.input[1] == input_name:
+            weights["embedding"] = initializers[node.input[0]]
+        elif node.op_type == "LSTM":
+            lstm_layer += 1
+            hidden = initializers[node.input[2]].shape[-1]
+            weights[f"lstm{lstm_layer}_W"] = initializers[node.input[1]][0]
+            weights[f"lstm{lstm_layer}_R"] = initializers[node.input[2]][0]
+            bias = initializers[node.input[3]][0]
+            weights[f"lstm{lstm_layer}_b"] = bias[:4 * hidden] + bias[4 * hidden:]
+        elif node.op_type == "Gemm":
+            dense_layer += 1
+            trans_b = next((a.i for a in node.attribute if a.name == "transB"), 0)
+            kernel = initializers[node.input[1]]
+            weights[f"fc{dense_layer}_W"] = kernel if trans_b else kernel.T
+            weights[f"fc{dense_layer}_b"] = initializers[node.input[2]]
+
+    if lstm_layer != 2 or dense_layer != 2 or "embedding" not in weights:
+        raise ValueError(f"Unexpected graph layout in {src}: {lstm_layer} LSTM, {dense_layer} Gemm nodes")
+
+    with open(src, "rb") as f:
+        weights["source_sha256"] = np.array(hashlib.sha256(f.read()).hexdigest())
+    if dst is not None:
+        np.savez(dst, **weights)
+    return weights
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+def _gate_scale(hidden: int) -> np.ndarray:
+    """Column scale that lets one tanh serve all gates: sigmoid(x) = 0.5 * (1 + tanh(x / 2))"""
+    return np.r_[np.full(3 * hidden, 0.5), np.ones(hidden)].astype(np.float32)
+
+
+def _lstm_cell(gates: np.ndarray, c: np.ndarray, hidden: int) -> tuple[np.ndarray, np.ndarray]:
+    """One LSTM step from pre-activations in ONNX gate order (i, o, f, c), pre-scaled by _gate_scale"""
+    t = np.tanh(gates)
+    iof = 0.5 * t[:, :3 * hidden] + 0.5
+    c = iof[:, 2 * hidden:] * c + iof[:, :hidden] * t[:, 3 * hidden:]
+    h = iof[:, hidden:2 * hidden] * np.tanh(c)
+    return h, c
+
+
+class NumpyLSTM:
+    """
+    Batched forward pass of Embedding -> LSTM -> LSTM -> Dense(relu) -> Dense(sigmoid).
+
+    Exposes get_inputs/get_outputs/run like onnxruntime.InferenceSession, so it
+    can stand in for the ORT session in backend/model.py.
+    """
+
+    def __init__(self, weights: dict):
+        f32 = np.float32
+        self.source_sha256 = str(weights.get("source_sha256", ""))
+        self.vocab_size = weights["embedding"].shape[0]
+        self.hidden1 = weights["lstm1_R"].shape[1]
+        self.hidden2 = weights["lstm2_R"].shape[1]
+        scale1, scale2 = _gate_scale(self.hidden1), _gate_scale(self.hidden2)
+        # Embedding and the first input projection collapse into one lookup table
+        self.gate_table = ((weights["embedding"] @ weights["lstm1_W"].T + weights["lstm1_b"]) * scale1).astype(f32)
+        self.R1_T = np.ascontiguousarray(weights["lstm1_R"].T * scale1, dtype=f32)
+        # Second layer input and recurrent kernels stacked, applied to [h1, h2] in one matmul
+        self.WR2_T = (np.concatenate([weights["lstm2_W"].T, weights["lstm2_R"].T]) * scale2).astype(f32)
+        self.b2 = (weights["lstm2_b"] * scale2).astype(f32)
+        self.fc1_T = np.ascontiguousarray(weights["fc1_W"].T, dtype=f32)
+        self.fc1_b = weights["fc1_b"].astype(f32)
+        self.fc2_T = np.ascontiguousarray(weights["fc2_W"].T, dtype=f32)
+        self.fc2_b = weights["fc2_b"].astype(f32)
+
+    @classmethod
+    def load(cls, path: Path = WEIGHTS_PATH) -> "NumpyLSTM":
+        with np.load(path) as weights:
+            return cls(dict(weights))
+
+    def zero_state(self, batch_size: int) -> tuple:
+        h1 = np.zeros((batch_size, self.hidden1), dtype=np.float32)
+        h2 = np.zeros((batch_size, self.hidden2), dtype=np.float32)
+        return h1, h1.copy(), h2, h2.copy()
+
+    def forward(self, x: np.ndarray, state: Optional[tuple] = None) -> tuple[np.ndarray, tuple]:
+        """
+        x: (batch, seq_len) character indices.
+        Returns ((batch, 1) probabilities at the last step, (h1, c1, h2, c2)).
+        """
+        x = np.asarray(x)
+        h1, c1, h2, c2 = state if state is not None else self.zero_state(x.shape[0])
+
+        # Both layers advance together, so memory stays O(batch * hidden) whatever the length
+        for column in x.T:
+            h1, c1 = _lstm_cell(self.gate_table[column] + h1 @ self.R1_T, c1, self.hidden1)
+            h2, c2 = _lstm_cell(np.concatenate([h1, h2], axis=1) @ self.WR2_T + self.b2, c2, self.hidden2)
+
+        hidden = np.maximum(h2 @ self.fc1_T + self.fc1_b, 0.0)
+        probabilities = _sigmoid(hidden @ self.fc2_T + self.fc2_b)
+        return probabilities, (h1, c1, h2, c2)
+
+    def get_inputs(self) -> List[NodeArg]:
+        return [NodeArg("input", ["batch_size", "seq_len"], "tensor(int64)")]
+
+    def get_outputs(self) -> List[NodeArg]:
+        return [NodeArg("output", ["batch_size", 1], "tensor(float)")]
+
+    def run(self, output_names, input_feed: dict) -> List[np.ndarray]:
+        probabilities, _ = self.forward(next(iter(input_feed.values())))
+        return [probabilities]
+
+
+_scorer: Optional[tuple] = None
+
+
+def score(texts: List[str], batch_size: int = 256) -> np.ndarray:
+    """
+    SQLi probability per text, with the serving preprocessing and only NumPy.
+    The weights and tokenizer are loaded on first use.
+    """
+    global _scorer
+    if _scorer is None:
+        _scorer = NumpyLSTM.load(), json.loads(TOKENIZER_PATH.read_text(encoding="utf-8"))
+    lstm, tokenizer_config = _scorer
+
+    probabilities = np.empty(len(texts), dtype=np.float32)
+    for start in range(0, len(texts), batch_size):
+        batch, _ = lstm.forward(encode_texts(texts[start:start + batch_size], tokenizer_config))
+        probabilities[start:start + batch_size] = batch[:, 0]
+    return probabilities
+
+
+def verify(tolerance: float = 1e-4, batch_size: int = 256) -> bool:
+    """Compare NumPy and onnxruntime outputs on the notebook's test split"""
+    import onnxruntime as ort
+    from backend import evaluate, model
+
+    tokenizer_config = json.loads(TOKENIZER_PATH.read_text(encoding="utf-8"))
+    texts, labels = evaluate.load_labelled(BASE_DIR / "Modified_SQL_Dataset.csv")
+    test_texts = [texts[i] for i in evaluate.test_split_indices(labels)]
+
+    session = ort.InferenceSession(str(MODEL_PATH))
+    lstm = NumpyLSTM.load()
+    max_diff = 0.0
+    mismatched = 0
+    for start in range(0, len(test_texts), batch_size):
+        batch = encode_texts(test_texts[start:start + batch_size], tokenizer_config)
+        expected = session.run(None, {session.get_inputs()[0].name: batch})[0]
+        actual = lstm.run(None, {"input": batch})[0]
+        max_diff = max(max_diff, float(np.max(np.abs(expected - actual))))
+        mismatched += int(np.sum((expected >= model.SQLI_THRESHOLD) != (actual >= model.SQLI_THRESHOLD)))
+
+    ok = max_diff <= tolerance
+    print(f"{'✓' if ok else '✗'} {len(test_texts):,} test rows: max |ORT - NumPy| = {max_diff:.2e} "
+          f"(tolerance {tolerance:.0e}), label mismatches = {mismatched}")
+    return ok
+
+
+# Imports timed in the benchmark child before anything else is loaded
+_BENCH_IMPORTS = {"onnxruntime": "import numpy, onnxruntime", "numpy": "import backend.numpy_lstm"}
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process; None when neither resource nor psutil is available"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB elsewhere
+
+
+def _bench_child(backend: str, batch_sizes: List[int], seconds: float, import_ms: float) -> None:
+    """Runs in a fresh interpreter so import time and memory are measured in isolation"""
+    start = time.perf_counter()
+    if backend == "onnxruntime":
+        import onnxruntime as ort
+        session = ort.InferenceSession(str(MODEL_PATH))
+    else:
+        session = NumpyLSTM.load()
+    loaded = time.perf_counter()
+
+    config = json.loads(TOKENIZER_PATH.read_text(encoding="utf-8"))
+    rng = np.random.default_rng(0)
+    input_name = session.get_inputs()[0].name
+    throughput = {}
+    for batch_size in batch_sizes:
+        batch = rng.integers(0, config["vocab_size"], size=(batch_size, config["max_len"]), dtype=np.int64)
+        session.run(None, {input_name: batch})  # warm-up
+        runs = 0
+        began = time.perf_counter()
+        while time.perf_counter() - began < seconds:
+            session.run(None, {input_name: batch})
+            runs += 1
+        throughput[batch_size] = runs * batch_size / (time.perf_counter() - began)
+
+    print(json.dumps({
+        "backend": backend,
+        "import_ms": import_ms,
+        "load_ms": (loaded - start) * 1000,
+        "max_rss_mb": _peak_rss_mb(),
+        "rows_per_sec": throughput,
+    }))
+
+
+def bench(batch_sizes: List[int], seconds: float) -> None:
+    """Benchmark both backends, each in its own process"""
+    results = []
+    for backend, imports in _BENCH_IMPORTS.items():
+        code = (
+            f"import time; start = time.perf_counter(); {imports}; import_ms = (time.perf_counter() - start) * 1000; "
+            f"from backend.numpy_lstm import _bench_child; "
+            f"_bench_child({backend!r}, {batch_sizes!r}, {seconds!r}, import_ms)"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print("=" * 70)
+    print(f"{'Backend':<12} {'Import ms':>10} {'Load ms':>9} {'Max RSS MB':>11}  Rows/sec by batch size")
+    print("=" * 70)
+    for r in results:
+        rates = "  ".join(f"{b}: {rate:,.0f}" for b, rate in r["rows_per_sec"].items())
+        rss = f"{r['max_rss_mb']:11.1f}" if r["max_rss_mb"] is not None else f"{'n/a':>11}"
+        print(f"{r['backend']:<12} {r['import_ms']:10.1f} {r['load_ms']:9.1f} {rss}  {rates}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Pure-NumPy SQLi LSTM backend tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("extract", help=f"Extract weights from {MODEL_PATH.name} into {WEIGHTS_PATH.name}")
+    verify_parser = sub.add_parser("verify", help="Compare against onnxruntime on the test split")
+    verify_parser.add_argument("--tolerance", type=float, default=1e-4)
+    bench_parser = sub.add_parser("bench", help="Import time, memory and throughput vs onnxruntime")
+    bench_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32, 256])
+    bench_parser.add_argument("--seconds", type=float, default=2.0, help="Time spent per batch size")
+    args = parser.parse_args(argv)
+
+    if args.command == "extract":
+        weights = extract_weights()
+        print(f"✓ Extracted {len(weights) - 1} arrays to {WEIGHTS_PATH}")
+    elif args.command == "verify":
+        sys.exit(0 if verify(args.tolerance) else 1)
+    else:
+        bench(args.batch_sizes, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
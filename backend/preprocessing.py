@@ -0,0 +1,100 @@
+"""
+Input normalization and encoding shared by every inference path.
+
+normalize_sql_input is the training-time preprocessing: expand_operators adds
+spaces around operators, then whitespace is collapsed and the text lowercased.
+StreamNormalizer applies the same rules to a body that arrives in chunks.
+Only NumPy is needed, so workers that score with the NumPy backend can use
+this without the API server's dependencies.
+"""
+import re
+from typing import List
+
+import numpy as np
+
+_OPERATOR_TAIL = re.compile(r'[=<>!]+$')
+_MAX_CARRY = 1024  # longer operator runs are flushed rather than buffered
+_TOKENS = re.compile(r'\s+|\S+')
+
+
+def expand_operators(text: str) -> str:
+    """The spacing rules of the training data, without the whitespace collapse"""
+    text = re.sub(r'([=<>!]+)', r'  \1  ', text)  # Operators
+    text = re.sub(r'([()])', r'  \1  ', text)      # Parentheses
+    text = re.sub(r',', ' , ', text)               # Commas
+    text = re.sub(r"'", " ' ", text)               # Single quotes
+    text = re.sub(r'"', ' " ', text)               # Double quotes
+    return text
+
+
+def collapse_whitespace(text: str) -> str:
+    """Single spaces, no leading/trailing whitespace, lowercase"""
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+def normalize_sql_input(text: str) -> str:
+    """
+    Normalize input to match training data format (add spaces around operators).
+    The training data has specific formatting with spaces around operators.
+    """
+    return collapse_whitespace(expand_operators(text))
+
+
+def encode_text(text: str, char_to_idx: dict, max_len: int) -> List[int]:
+    """Encode text to sequence of character indices"""
+    encoded = []
+    for char in text[:max_len]:
+        encoded.append(char_to_idx.get(char, char_to_idx.get('<UNK>', 1)))
+
+    # Pad if necessary
+    pad_idx = char_to_idx.get('<PAD>', 0)
+    while len(encoded) < max_len:
+        encoded.append(pad_idx)
+
+    return encoded
+
+
+def encode_texts(texts: List[str], tokenizer_config: dict) -> np.ndarray:
+    """Normalize and encode texts into a (batch, max_len) int64 array"""
+    char_to_idx = tokenizer_config['char_to_idx']
+    max_len = tokenizer_config['max_len']
+    encoded = [encode_text(normalize_sql_input(text), char_to_idx, max_len) for text in texts]
+    return np.array(encoded, dtype=np.int64).reshape(len(texts), max_len)
+
+
+class StreamNormalizer:
+    """
+    Chunked equivalent of normalize_sql_input.
+    Concatenating every feed() result and finish() gives the same string as
+    normalizing the whole text at once (except for context-dependent
+    lowercasing such as the Greek final sigma across a chunk boundary).
+    """
+
+    def __init__(self):
+        self._carry = ""           # trailing operator run, may continue in the next chunk
+        self._started = False      # something was emitted (leading whitespace is stripped)
+        self._pending_space = False
+
+    def feed(self, text: str) -> str:
+        text = self._carry + text
+        match = _OPERATOR_TAIL.search(text)
+        cut = match.start() if match and len(text) - match.start() <= _MAX_CARRY else len(text)
+        self._carry = text[cut:]
+        return self._emit(text[:cut])
+
+    def finish(self) -> str:
+        text, self._carry = self._carry, ""
+        return self._emit(text)  # a pending trailing space is dropped, like strip()
+
+    def _emit(self, text: str) -> str:
+        out = []
+        for token in _TOKENS.findall(expand_operators(text)):
+            if token[0].isspace():
+                self._pending_space = self._started
+                continue
+            if self._pending_space:
+                out.append(" ")
+                self._pending_space = False
+            out.append(token.lower())
+            self._started = True
+        return "".join(out)
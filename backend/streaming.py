@@ -0,0 +1,195 @@
+"""
+Incremental scoring of streamed request bodies with a stateful LSTM.
+
+`export_stateful_model` rewrites sqli_lstm.onnx so that both LSTM layers take
+their hidden and cell states as inputs and return them as outputs, and so the
+sequence length is dynamic. A body can then be fed through the model chunk by
+chunk, keeping only the recurrent state per stream instead of the full body.
+
+Usage (writes models/sqli_lstm_stream.onnx for inspection; the server builds it in memory):
+    uv run python -m backend.streaming
+"""
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+try:
+    from backend.preprocessing import StreamNormalizer
+except ModuleNotFoundError:  # imported by `python backend/model.py`
+    from preprocessing import StreamNormalizer
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODEL_PATH = BASE_DIR / "models" / "sqli_lstm.onnx"
+STREAM_MODEL_PATH = BASE_DIR / "models" / "sqli_lstm_stream.onnx"
+
+
+def _prune_dead_nodes(graph) -> None:
+    """Drop nodes whose outputs no longer reach a graph output"""
+    needed = {o.name for o in graph.output}
+    keep = []
+    for node in reversed(graph.node):
+        if any(name in needed for name in node.output):
+            keep.append(node)
+            needed.update(name for name in node.input if name)
+    live = list(reversed(keep))
+    del graph.node[:]
+    graph.node.extend(live)
+
+
+def export_stateful_model(src: Path = MODEL_PATH, dst: Optional[Path] = None):
+    """
+    Build the stateful variant of the exported LSTM and return the onnx.ModelProto.
+
+    Inputs:  input (batch, seq_len) int64, h1_in/c1_in (1, batch, 128), h2_in/c2_in (1, batch, 64)
+    Outputs: output (batch, 1) = probability at the last step of the chunk, h1_out/c1_out/h2_out/c2_out
+    """
+    import onnx
+    from onnx import TensorProto, helper
+
+    model = onnx.load(str(src))
+    graph = model.graph
+
+    lstm_nodes = [node for node in graph.node if node.op_type == "LSTM"]
+    if len(lstm_nodes) != 2:
+        raise ValueError(f"Expected 2 LSTM nodes in {src}, found {len(lstm_nodes)}")
+
+    graph.input[0].type.tensor_type.shape.dim[1].dim_param = "seq_len"
+
+    for layer, node in enumerate(lstm_nodes, start=1):
+        hidden_size = next(helper.get_attribute_value(a) for a in node.attribute if a.name == "hidden_size")
+        state_shape = [1, "batch_size", hidden_size]
+
+        while len(node.input) < 7:
+            node.input.append("")
+        while len(node.output) < 3:
+            node.output.append("")
+
+        for slot, kind in ((5, "h"), (6, "c")):
+            name = f"{kind}{layer}_in"
+            node.input[slot] = name
+            graph.input.append(helper.make_tensor_value_info(name, TensorProto.FLOAT, state_shape))
+
+        for slot, kind in ((1, "h"), (2, "c")):
+            if not node.output[slot]:
+                node.output[slot] = f"/lstm{layer}/Y_{kind}"
+            name = f"{kind}{layer}_out"
+            graph.node.append(helper.make_node("Identity", [node.output[slot]], [name]))
+            graph.output.append(helper.make_tensor_value_info(name, TensorProto.FLOAT, state_shape))
+
+    _prune_dead_nodes(graph)
+    del graph.value_info[:]
+    onnx.checker.check_model(model)
+
+    if dst is not None:
+        onnx.save(model, str(dst))
+    return model
+
+
+class StreamingDetector:
+    """Stateful ONNX session plus tokenizer; opens one SQLiStream per request body"""
+
+    def __init__(self, session, tokenizer_config: dict, threshold: float = 0.5):
+        self._init_tokenizer(tokenizer_config, threshold)
+        self.session = session
+        self.state_shapes = {
+            i.name: [1, 1, i.shape[2]] for i in session.get_inputs() if i.name != "input"
+        }
+        self._state_names = [o.name.replace("_out", "_in") for o in session.get_outputs()[1:]]
+
+    def _init_tokenizer(self, tokenizer_config: dict, threshold: float) -> None:
+        self.char_to_idx = tokenizer_config["char_to_idx"]
+        self.max_len = tokenizer_config["max_len"]
+        self.unk_idx = self.char_to_idx.get("<UNK>", 1)
+        self.pad_idx = self.char_to_idx.get("<PAD>", 0)
+        self.threshold = threshold
+
+    @classmethod
+    def from_model(cls, model_path: Path, tokenizer_config: dict, threshold: float = 0.5) -> "StreamingDetector":
+        import onnxruntime as ort
+
+        stateful = export_stateful_model(model_path)
+        session = ort.InferenceSession(stateful.SerializeToString())
+        return cls(session, tokenizer_config, threshold)
+
+    def zero_state(self):
+        return {name: np.zeros(shape, dtype=np.float32) for name, shape in self.state_shapes.items()}
+
+    def step(self, encoded: np.ndarray, state) -> tuple[float, dict]:
+        """Run a (1, n) chunk of indices from `state`; returns (probability at last step, new state)"""
+        outputs = self.session.run(None, {"input": encoded, **state})
+        return float(outputs[0][0, 0]), dict(zip(self._state_names, outputs[1:]))
+
+    def encode(self, text: str) -> np.ndarray:
+        return np.array([[self.char_to_idx.get(c, self.unk_idx) for c in text]], dtype=np.int64)
+
+    def open(self) -> "SQLiStream":
+        return SQLiStream(self)
+
+
+class NumpyStreamingDetector(StreamingDetector):
+    """Same streaming API on the NumPy backend; the state is its (h1, c1, h2, c2) tuple"""
+
+    def __init__(self, lstm, tokenizer_config: dict, threshold: float = 0.5):
+        self._init_tokenizer(tokenizer_config, threshold)
+        self.lstm = lstm
+
+    def zero_state(self) -> tuple:
+        return self.lstm.zero_state(1)
+
+    def step(self, encoded: np.ndarray, state: tuple) -> tuple[float, tuple]:
+        probabilities, state = self.lstm.forward(encoded, state)
+        return float(probabilities[0, 0]), state
+
+
+class SQLiStream:
+    """
+    Running SQLi score for one streamed body.
+
+    While fewer than max_len characters have been scored, the running score is
+    taken after padding to max_len (without committing the padding), so it
+    equals predict_sqli on the prefix. Past max_len the model keeps reading
+    instead of truncating, and the score is the output at the latest character.
+    """
+
+    def __init__(self, detector: StreamingDetector):
+        self.detector = detector
+        self.normalizer = StreamNormalizer()
+        self.state = detector.zero_state()
+        self.consumed = 0
+        self.score = 0.0
+        self.blocked = False
+        self._last_output = None
+
+    def feed(self, chunk: str) -> float:
+        """Score the next piece of the body; sets `blocked` once the score crosses the threshold"""
+        self._consume(self.normalizer.feed(chunk))
+        return self._update_score()
+
+    def finish(self) -> float:
+        """Flush the normalizer and return the final score"""
+        self._consume(self.normalizer.finish())
+        return self._update_score()
+
+    def _consume(self, text: str) -> None:
+        max_len = self.detector.max_len
+        for start in range(0, len(text), max_len):
+            piece = text[start:start + max_len]
+            self._last_output, self.state = self.detector.step(self.detector.encode(piece), self.state)
+            self.consumed += len(piece)
+
+    def _update_score(self) -> float:
+        remaining = self.detector.max_len - self.consumed
+        if remaining > 0:
+            padding = np.full((1, remaining), self.detector.pad_idx, dtype=np.int64)
+            self.score, _ = self.detector.step(padding, self.state)
+        else:
+            self.score = self._last_output
+        if self.score >= self.detector.threshold:
+            self.blocked = True
+        return self.score
+
+
+if __name__ == "__main__":
+    export_stateful_model(MODEL_PATH, STREAM_MODEL_PATH)
+    print(f"✓ Stateful model exported: {STREAM_MODEL_PATH}")
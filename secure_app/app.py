@@ -3,13 +3,21 @@ Secure Flask Application - Uses ML Model for Attack Detection
 WARNING: SQL queries are STILL vulnerable! The model just detects and blocks attacks.
 This demonstrates how ML can protect vulnerable applications.
 """
-from flask import Flask, request, render_template, redirect, url_for, session, jsonify
+from flask import Flask, request, render_template, redirect, url_for, session, jsonify, g
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import os
+import sys
+import time
+from pathlib import Path
 import requests
 from dotenv import load_dotenv
 
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+from backend.admission import AdmissionController, BLOCKED, SHED
+from backend.audit import AuditLog, payload_hash
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -17,34 +25,85 @@ app.secret_key = 'super_secret_key_123'  # Intentionally weak (not fixed)
 
 DETECTION_API = 'http://127.0.0.1:8000/predict'  # SQLi detection API
 
+# Per-client rate limit and reputation table, checked before calling the detection API
+admission = AdmissionController.from_env()
+
+# Detections, blocked requests and executed queries go to logs/audit/ from a background thread
+audit = AuditLog.from_env(BASE_DIR / 'logs' / 'audit').start()
+
 
-def check_for_attack(text):
+def client_key():
+    """Identify the current client by a configured API key, falling back to its IP address"""
+    return admission.client_id(request.remote_addr, api_key=request.headers.get('X-API-Key'))
+
+
+def check_for_attack(text, field=None):
     """
     Send text to the SQLi detection API.
     Returns (is_attack, probability, label) or (False, 0, 'Unknown') if API unavailable.
+    Clients over their rate get (True, 0, 'Rate Limited') and clients with repeated
+    SQLi get (True, 1.0, 'Blocked Client'), both without a model pass.
+    Every check is recorded in the audit log; its latency and model version are kept
+    on flask.g so audit_blocked can add them to the blocked record.
     """
     if not text or not text.strip():
         return False, 0, 'Normal'
     
+    client = client_key()
+    started = time.perf_counter()
+    
+    def log_detection(label, probability=None, model_version=None, **extra):
+        g.detection = {'latency_ms': round((time.perf_counter() - started) * 1000, 3),
+                       'model_version': model_version}
+        audit.emit('detection', route=request.path, field=field, client=client,
+                   payload_sha256=payload_hash(text), payload_len=len(text),
+                   label=label, probability=probability, **g.detection, **extra)
+    
+    decision = admission.admit(client)
+    if decision == BLOCKED:
+        log_detection('Blocked Client', 1.0, source='reputation')
+        return True, 1.0, 'Blocked Client'
+    if decision == SHED:
+        log_detection('Rate Limited', source='admission')
+        return True, 0, 'Rate Limited'
+    
     try:
         payload = {"text": text}
-        
-        print(f"[DETECTION] Checking input: {text[:50]}...")
-        response = requests.post(DETECTION_API, json=payload, timeout=2)
+        response = requests.post(DETECTION_API, json=payload, headers={'X-Client-Id': client}, timeout=2)
         
         if response.status_code == 200:
             result = response.json()
             is_attack = result.get('label') == 'SQLi'
             probability = result.get('probability', 0)
             label = result.get('label', 'Unknown')
-            print(f"[DETECTION] Result: {label} (probability: {probability:.4f})")
+            source = result.get('source', 'model')
+            log_detection(label, probability, source=source, model_version=result.get('model_version'))
+            if is_attack and source == 'model':
+                admission.record(client)
             return is_attack, probability, label
+        if response.status_code == 429:
+            log_detection('Rate Limited', source='detector')
+            return True, 0, 'Rate Limited'
+        log_detection('API Error', status_code=response.status_code)
         return False, 0, 'API Error'
     except Exception as e:
-        print(f"[DETECTION] API Error: {e}")
+        log_detection('API Unavailable', error=str(e))
         return False, 0, 'API Unavailable'
 
 
+def audit_blocked(field_name, field_value, probability, label):
+    """Record a request rejected by the detector or rate limit, with the latency and model version of its check"""
+    detection = g.get('detection', {'latency_ms': None, 'model_version': None})
+    audit.emit('blocked', route=request.path, field=field_name, client=client_key(),
+               payload_sha256=payload_hash(field_value), probability=probability, label=label,
+               **detection)
+
+
+def audit_query(query):
+    """Record that a (still vulnerable) query is about to run"""
+    audit.emit('query', route=request.path, client=client_key(), query_sha256=payload_hash(query))
+
+
 def get_db():
     """Get database connection to Azure PostgreSQL"""
     conn = psycopg2.connect(
@@ -84,11 +143,14 @@ def login():
         
         # Check username and password for SQLi attacks
         for field_name, field_value in [('username', username), ('password', password)]:
-            is_attack, probability, label = check_for_attack(field_value)
+            is_attack, probability, label = check_for_attack(field_value, field_name)
             if is_attack:
                 attack_blocked = True
+                audit_blocked(field_name, field_value, probability, label)
+                if label == 'Rate Limited':
+                    error = '⏳ Too many requests. Please slow down and try again.'
+                    return render_template('login.html', error=error, attack_blocked=attack_blocked), 429
                 error = f'🚨 SQL INJECTION DETECTED in {field_name}! Request blocked. (Confidence: {probability:.1%})'
-                print(f"[BLOCKED] SQLi in {field_name}: '{field_value}' (confidence: {probability:.1%})")
                 return render_template('login.html', error=error, attack_blocked=attack_blocked)
         
         conn = get_db()
@@ -96,7 +158,7 @@ def login():
         
         # VULNERABLE: Direct string concatenation - SQL Injection! (NOT FIXED)
         query = f"SELECT * FROM users WHERE userName = '{username}' AND password = '{password}'"
-        print(f"[DEBUG] Executing query: {query}")
+        audit_query(query)
         
         try:
             cursor.execute(query)
@@ -118,6 +180,18 @@ def login():
     return render_template('login.html', error=error, attack_blocked=attack_blocked)
 
 
+@app.route('/admission/stats')
+def admission_stats():
+    """Admitted, shed and blocked detection requests for this app"""
+    return jsonify(admission.stats())
+
+
+@app.route('/audit/stats')
+def audit_stats():
+    """Audit log queue depth, written, dropped and rotated counts"""
+    return jsonify(audit.stats())
+
+
 @app.route('/logout')
 def logout():
     """Logout user"""
@@ -138,16 +212,16 @@ def products():
     # Check search and category for SQLi attacks
     for field_name, field_value in [('search', search), ('category', category)]:
         if field_value:
-            is_attack, probability, label = check_for_attack(field_value)
+            is_attack, probability, label = check_for_attack(field_value, field_name)
             if is_attack:
                 attack_blocked = True
-                print(f"[BLOCKED] SQLi in {field_name}: '{field_value}' (confidence: {probability:.1%})")
+                audit_blocked(field_name, field_value, probability, label)
                 return render_template('products.html', 
                                      products=[], 
                                      search=search, 
                                      category=category,
                                      attack_blocked=True,
-                                     attack_probability=probability)
+                                     attack_probability=probability), 429 if label == 'Rate Limited' else 200
     
     conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
@@ -160,7 +234,7 @@ def products():
     else:
         query = "SELECT * FROM products"
     
-    print(f"[DEBUG] Executing query: {query}")
+    audit_query(query)
     
     try:
         cursor.execute(query)
@@ -184,7 +258,7 @@ def product_detail(product_id):
     
     # VULNERABLE: Even though product_id is typed as int, the route can be bypassed (NOT FIXED)
     query = f"SELECT * FROM products WHERE productID = '{product_id}'"
-    print(f"[DEBUG] Executing query: {query}")
+    audit_query(query)
     
     try:
         cursor.execute(query)
@@ -204,24 +278,27 @@ def api_search():
     VULNERABLE API ENDPOINT - SQL Injection possible!
     But protected by ML attack detection.
     """
+    query_param = request.args.get('q', '')
+    
     # Check for attack using ML model
-    is_attack, probability, label = check_for_attack(request)
+    is_attack, probability, label = check_for_attack(query_param, 'q')
     
     if is_attack:
+        audit_blocked('q', query_param, probability, label)
+        if label == 'Rate Limited':
+            return jsonify({'error': 'Too many requests', 'blocked': True}), 429
         return jsonify({
             'error': 'Attack detected',
             'blocked': True,
             'confidence': probability
         }), 403
     
-    query_param = request.args.get('q', '')
-    
     conn = get_db()
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     # VULNERABLE: Direct string concatenation (NOT FIXED)
     query = f"SELECT productID, productName, price FROM products WHERE productName LIKE '%{query_param}%'"
-    print(f"[DEBUG] API Query: {query}")
+    audit_query(query)
     
     try:
         cursor.execute(query)
@@ -0,0 +1,31 @@
+import string
+
+import numpy as np
+import pytest
+
+MAX_LEN = 24
+HIDDEN1, HIDDEN2, EMBED, DENSE = 16, 8, 6, 5
+
+
+@pytest.fixture
+def tokenizer_config():
+    chars = string.ascii_lowercase + string.digits + " '\"(),=<>!-;*"
+    char_to_idx = {"<PAD>": 0, "<UNK>": 1, **{c: i + 2 for i, c in enumerate(chars)}}
+    return {"char_to_idx": char_to_idx, "max_len": MAX_LEN, "vocab_size": len(char_to_idx)}
+
+
+@pytest.fixture
+def lstm_weights(tokenizer_config):
+    """Random weights in the layout written by numpy_lstm.extract_weights (ONNX gate order i, o, f, c)"""
+    rng = np.random.default_rng(0)
+
+    def w(*shape):
+        return rng.normal(0.0, 0.5, size=shape).astype(np.float32)
+
+    return {
+        "embedding": w(tokenizer_config["vocab_size"], EMBED),
+        "lstm1_W": w(4 * HIDDEN1, EMBED), "lstm1_R": w(4 * HIDDEN1, HIDDEN1), "lstm1_b": w(4 * HIDDEN1),
+        "lstm2_W": w(4 * HIDDEN2, HIDDEN1), "lstm2_R": w(4 * HIDDEN2, HIDDEN2), "lstm2_b": w(4 * HIDDEN2),
+        "fc1_W": w(DENSE, HIDDEN2), "fc1_b": w(DENSE),
+        "fc2_W": w(1, DENSE), "fc2_b": w(1),
+    }
@@ -0,0 +1,49 @@
+from backend.admission import ADMIT, BLOCKED, SHED, AdmissionController
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_controller(**kwargs):
+    clock = FakeClock()
+    return AdmissionController(rate=1.0, burst=3, strikes=2, reputation_ttl=10.0, clock=clock, **kwargs), clock
+
+
+def test_bucket_sheds_over_burst_and_refills():
+    admission, clock = make_controller()
+    assert [admission.admit("a") for _ in range(4)] == [ADMIT, ADMIT, ADMIT, SHED]
+    assert admission.admit("b") == ADMIT  # other clients keep their own budget
+    clock.now = 1.0
+    assert admission.admit("a") == ADMIT
+    assert admission.admit("a") == SHED
+
+
+def test_cost_larger_than_burst_is_never_admitted():
+    admission, clock = make_controller()
+    clock.now = 1000.0
+    assert admission.admit("a", cost=4) == SHED
+    assert admission.admit("a", cost=3) == ADMIT
+
+
+def test_repeated_sqli_blocks_until_ttl_expires():
+    admission, clock = make_controller()
+    admission.record("a")
+    assert admission.admit("a") == ADMIT
+    admission.record("a")
+    assert admission.admit("a") == BLOCKED
+    clock.now = 10.0
+    assert admission.admit("a") == ADMIT
+    assert admission.stats()["blocked"] == 1
+
+
+def test_client_id_ignores_untrusted_headers():
+    admission, _ = make_controller(api_keys=["secret"], trusted_peers=["127.0.0.1"])
+    assert admission.client_id("203.0.113.5", api_key="random") == "203.0.113.5"
+    assert admission.client_id("203.0.113.5", forwarded_id="spoofed") == "203.0.113.5"
+    assert admission.client_id("203.0.113.5", api_key="secret") == "key:secret"
+    assert admission.client_id("127.0.0.1", forwarded_id="198.51.100.7") == "198.51.100.7"
@@ -0,0 +1,64 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from backend.audit import BLOCK, DROP, AuditLog
+
+
+def test_records_are_written_and_rotated_per_process(tmp_path):
+    audit = AuditLog(tmp_path, flush_interval=0.01, max_bytes=200, backup_count=2).start()
+    for i in range(20):
+        audit.emit("detection", label="SQLi", index=i)
+    audit.close()
+
+    assert audit.path == tmp_path / f"audit-{os.getpid()}.jsonl"
+    rotated = sorted(tmp_path.glob("audit-*.jsonl.gz"))
+    assert len(rotated) <= 2
+    assert all(path.name.endswith(f"-{os.getpid()}.jsonl.gz") for path in rotated)
+    with gzip.open(rotated[-1], "rt", encoding="utf-8") as f:
+        record = json.loads(f.readline())
+    assert record["event"] == "detection" and record["label"] == "SQLi"
+    assert audit.stats()["written"] == 20
+
+
+def test_full_queue_drops_and_counts(tmp_path):
+    audit = AuditLog(tmp_path, max_queue=2, policy=DROP)  # writer not started
+    assert audit.emit("detection") and audit.emit("detection")
+    assert audit.emit("detection") is False
+    assert audit.stats()["dropped"] == 1
+
+
+def test_block_policy_gives_up_after_timeout(tmp_path):
+    audit = AuditLog(tmp_path, max_queue=1, policy=BLOCK, block_timeout=0.05)
+    assert audit.emit("detection")
+    assert audit.emit("detection") is False
+    assert audit.stats()["dropped"] == 1
+
+
+def test_unknown_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        AuditLog(tmp_path, policy="bogus")
+
+
+def test_emit_after_close_is_dropped(tmp_path):
+    audit = AuditLog(tmp_path, flush_interval=0.01, policy=BLOCK).start()
+    audit.close()
+    assert audit.emit("detection") is False
+    assert audit.stats()["dropped"] == 1
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_child_gets_its_own_writer(tmp_path):
+    audit = AuditLog(tmp_path, flush_interval=0.01).start()
+    pid = os.fork()
+    if pid == 0:
+        ok = all(audit.emit("detection", index=i) for i in range(3))
+        audit.close()
+        os._exit(0 if ok and audit.stats()["written"] == 3 else 1)
+    _, status = os.waitpid(pid, 0)
+    audit.close()
+    assert os.waitstatus_to_exitcode(status) == 0
+    lines = (tmp_path / f"audit-{pid}.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["index"] for line in lines] == [0, 1, 2]
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from backend.evaluate import (
+    ScoredDataset, average_precision, confusion_at, length_bucket_errors, pr_curve, roc_auc,
+    roc_curve, suggest_threshold,
+)
+
+# Sorted by score: 0.9+ 0.8+ 0.6+ 0.4- 0.4- 0.35+ 0.1- 0.05- (a tie at 0.4)
+LABELS = np.array([0, 0, 1, 1, 0, 1, 1, 0], dtype=np.int8)
+PROBS = np.array([0.1, 0.4, 0.35, 0.8, 0.4, 0.9, 0.6, 0.05], dtype=np.float32)
+
+
+def test_roc_curve_has_one_point_per_distinct_score():
+    fpr, tpr, thresholds = roc_curve(LABELS, PROBS)
+    assert thresholds[0] == np.inf
+    np.testing.assert_allclose(thresholds[1:], [0.9, 0.8, 0.6, 0.4, 0.35, 0.1, 0.05])
+    np.testing.assert_allclose(fpr, [0, 0, 0, 0, 0.5, 0.5, 0.75, 1])
+    np.testing.assert_allclose(tpr, [0, 0.25, 0.5, 0.75, 0.75, 1, 1, 1])
+    assert roc_auc(LABELS, PROBS) == pytest.approx(0.875)
+
+
+def test_pr_curve_and_average_precision():
+    precision, recall, thresholds = pr_curve(LABELS, PROBS)
+    np.testing.assert_allclose(thresholds, [0.9, 0.8, 0.6, 0.4, 0.35, 0.1, 0.05])
+    np.testing.assert_allclose(precision, [1, 1, 1, 3 / 5, 4 / 6, 4 / 7, 4 / 8])
+    np.testing.assert_allclose(recall, [0.25, 0.5, 0.75, 0.75, 1, 1, 1])
+    assert average_precision(LABELS, PROBS) == pytest.approx(0.75 + 0.25 * 4 / 6)
+
+
+def test_suggest_threshold_best_f1_and_max_fpr():
+    assert suggest_threshold(LABELS, PROBS) == pytest.approx(0.6)
+    assert suggest_threshold(LABELS, PROBS, max_fpr=0.25) == pytest.approx(0.6)
+    assert suggest_threshold(LABELS, PROBS, max_fpr=0.5) == pytest.approx(0.35)
+
+
+def test_suggest_threshold_without_allowed_point_predicts_nothing():
+    labels = np.array([0, 1], dtype=np.int8)
+    probs = np.array([0.9, 0.1], dtype=np.float32)
+    threshold = suggest_threshold(labels, probs, max_fpr=0.0)
+    assert threshold > 0.9
+    assert confusion_at(labels, probs, threshold) == {"tn": 1, "fp": 0, "fn": 1, "tp": 0}
+
+
+def test_length_bucket_errors_edges_and_truncated_bucket():
+    data = ScoredDataset(
+        probabilities=np.array([0.9, 0.1, 0.9, 0.9, 0.1, 0.9], dtype=np.float32),
+        labels=np.array([1, 1, 0, 1, 0, 0], dtype=np.int8),
+        lengths=np.array([0, 15, 16, 40, 41, 500], dtype=np.int32),
+    )
+    rows = {row["bucket"]: row for row in length_bucket_errors(data, threshold=0.5, max_len=40)}
+    assert list(rows) == ["0-15", "16-31", "32-40", ">40"]
+    assert (rows["0-15"]["count"], rows["0-15"]["fn"], rows["0-15"]["error_rate"]) == (2, 1, 0.5)
+    assert (rows["16-31"]["count"], rows["16-31"]["fp"]) == (1, 1)
+    assert (rows["32-40"]["count"], rows["32-40"]["tp"], rows["32-40"]["error_rate"]) == (1, 1, 0.0)
+    assert (rows[">40"]["count"], rows[">40"]["tn"], rows[">40"]["fp"]) == (2, 1, 1)
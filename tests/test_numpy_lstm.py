@@ -0,0 +1,54 @@
+import numpy as np
+
+from backend.numpy_lstm import NumpyLSTM
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def reference_layer(inputs, W, R, b):
+    """Textbook LSTM over (batch, steps, features), ONNX gate order i, o, f, c"""
+    hidden = R.shape[1]
+    h = np.zeros((inputs.shape[0], hidden))
+    c = np.zeros((inputs.shape[0], hidden))
+    outputs = []
+    for t in range(inputs.shape[1]):
+        z = inputs[:, t] @ W.T + h @ R.T + b
+        i, o, f, g = (z[:, k * hidden:(k + 1) * hidden] for k in range(4))
+        c = sigmoid(f) * c + sigmoid(i) * np.tanh(g)
+        h = sigmoid(o) * np.tanh(c)
+        outputs.append(h)
+    return np.stack(outputs, axis=1)
+
+
+def reference_forward(weights, x):
+    w = {name: value.astype(np.float64) for name, value in weights.items()}
+    out = reference_layer(w["embedding"][x], w["lstm1_W"], w["lstm1_R"], w["lstm1_b"])
+    out = reference_layer(out, w["lstm2_W"], w["lstm2_R"], w["lstm2_b"])[:, -1]
+    hidden = np.maximum(out @ w["fc1_W"].T + w["fc1_b"], 0.0)
+    return sigmoid(hidden @ w["fc2_W"].T + w["fc2_b"])
+
+
+def random_batch(tokenizer_config, batch=5, steps=30):
+    rng = np.random.default_rng(1)
+    return rng.integers(0, tokenizer_config["vocab_size"], size=(batch, steps), dtype=np.int64)
+
+
+def test_forward_matches_per_gate_reference(lstm_weights, tokenizer_config):
+    x = random_batch(tokenizer_config)
+    probabilities, _ = NumpyLSTM(lstm_weights).forward(x)
+    assert probabilities.shape == (5, 1)
+    np.testing.assert_allclose(probabilities, reference_forward(lstm_weights, x), atol=1e-5)
+
+
+def test_split_forward_with_state_equals_single_pass(lstm_weights, tokenizer_config):
+    lstm = NumpyLSTM(lstm_weights)
+    x = random_batch(tokenizer_config)
+    expected, expected_state = lstm.forward(x)
+    for k in (1, 13, 29):
+        _, state = lstm.forward(x[:, :k])
+        probabilities, final_state = lstm.forward(x[:, k:], state)
+        np.testing.assert_allclose(probabilities, expected, atol=1e-6)
+        for actual, wanted in zip(final_state, expected_state):
+            np.testing.assert_allclose(actual, wanted, atol=1e-6)
@@ -0,0 +1,35 @@
+import random
+
+from backend.preprocessing import StreamNormalizer, normalize_sql_input
+
+# Operators, quotes and mixed whitespace exercise every spacing rule and the
+# operator carry between chunks. The Greek sigma is left out: its lowercase
+# depends on the next character, which may sit in the following chunk.
+ALPHABET = "aB1 =<>!()',\"\t\n;-_É"
+
+
+def normalize_in_chunks(text, rng):
+    normalizer = StreamNormalizer()
+    out, start = [], 0
+    while start < len(text):
+        end = start + rng.randint(1, 6)
+        out.append(normalizer.feed(text[start:end]))
+        start = end
+    out.append(normalizer.finish())
+    return "".join(out)
+
+
+def test_stream_normalizer_matches_normalize_sql_input():
+    rng = random.Random(0)
+    for _ in range(5000):
+        text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 40)))
+        assert normalize_in_chunks(text, rng) == normalize_sql_input(text), repr(text)
+
+
+def test_stream_normalizer_on_sql_payloads():
+    rng = random.Random(1)
+    for text in ["  SELECT * FROM users WHERE id=1 OR 1==1--  ",
+                 "admin'<>'x' AND (a!=b)",
+                 "name,\"value\"\t>=\n<=  10"]:
+        for _ in range(200):
+            assert normalize_in_chunks(text, rng) == normalize_sql_input(text)
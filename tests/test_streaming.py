@@ -0,0 +1,61 @@
+import random
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import model
+from backend.admission import AdmissionController
+from backend.numpy_lstm import NumpyLSTM
+from backend.preprocessing import encode_texts
+from backend.streaming import NumpyStreamingDetector
+
+# No operator characters: the normalizer holds those back until the next chunk,
+# so every feed() then scores exactly normalize_sql_input(prefix).
+ALPHABET = "selct from where 1'\"(),;-*"
+
+
+def test_running_score_equals_full_prediction_on_prefix(lstm_weights, tokenizer_config):
+    lstm = NumpyLSTM(lstm_weights)
+    detector = NumpyStreamingDetector(lstm, tokenizer_config, threshold=2.0)
+    rng = random.Random(0)
+    for _ in range(50):
+        text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 40)))
+        stream, fed = detector.open(), 0
+        while fed < len(text):
+            step = rng.randint(1, 7)
+            score = stream.feed(text[fed:fed + step])
+            fed += step
+            if stream.consumed < tokenizer_config["max_len"]:
+                expected, _ = lstm.forward(encode_texts([text[:fed]], tokenizer_config))
+                assert score == pytest.approx(float(expected[0, 0]), abs=1e-6)
+        if stream.consumed <= tokenizer_config["max_len"]:
+            expected, _ = lstm.forward(encode_texts([text], tokenizer_config))
+            assert stream.finish() == pytest.approx(float(expected[0, 0]), abs=1e-6)
+
+
+@pytest.fixture
+def client(lstm_weights, tokenizer_config, monkeypatch):
+    detector = NumpyStreamingDetector(NumpyLSTM(lstm_weights), tokenizer_config, threshold=2.0)
+    monkeypatch.setattr(model, "streaming_detector", detector)
+    monkeypatch.setattr(model, "admission", AdmissionController(rate=0.0))  # no refill during a test
+    return TestClient(model.app)
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_body_just_under_the_cap_is_admitted_for_a_fresh_client(client, chunked):
+    body = b"a" * (model.STREAM_MAX_BYTES - 1)
+    content = (body[i:i + 4096] for i in range(0, len(body), 4096)) if chunked else body
+    response = client.post("/predict/stream", content=content)
+    assert response.status_code == 200
+    assert response.json()["chars_scored"] == len(body)
+    # The stream was charged a full bucket, never more
+    assert client.post("/predict/stream", content=b"a").status_code == 429
+    assert model.admission.stats()["shed"] == 1
+
+
+def test_oversized_and_malformed_bodies_are_rejected(client):
+    assert client.post("/predict/stream", content=b"a" * (model.STREAM_MAX_BYTES + 1)).status_code == 413
+    response = client.post("/predict/stream", content=b"abc", headers={"Content-Length": "abc"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid Content-Length header"